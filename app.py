@@ -1,23 +1,26 @@
 # app.py
 import os
-import base64
+from collections import deque
+from pathlib import Path
 
 import streamlit as st
-from dotenv import load_dotenv
-from openai import OpenAI
+
+from chat_core import (
+    MAX_LOCAL_MESSAGES,
+    get_api_key,
+    get_client,
+    render_chat_tab,
+    render_image_tab,
+)
 
 # --- Load env (works locally; Streamlit Cloud can use st.secrets instead) ---
-load_dotenv(override=False)
+_env_file = Path(__file__).with_name(".env")
+if _env_file.exists():
+    from dotenv import load_dotenv
+
+    load_dotenv(_env_file, override=False)
 
-def _get_api_key() -> str | None:
-    key = os.getenv("OPENAI_API_KEY")
-    if key:
-        return key
-    # Streamlit Cloud: add OPENAI_API_KEY in App Secrets
-    try:
-        return st.secrets["OPENAI_API_KEY"]  # type: ignore[index]
-    except Exception:
-        return None
+_DEFAULT_SYS_PROMPT = "You are a helpful, concise assistant."
 
 # --- Configure page ---
 st.set_page_config(page_title="AI Chatbot (OpenAI + Streamlit)", page_icon="🤖")
@@ -35,166 +38,38 @@ with st.sidebar:
     )
     sys_prompt = st.text_area(
         "System prompt",
-        value="You are a helpful, concise assistant.",
+        value=_DEFAULT_SYS_PROMPT,
         height=96,
         help="Applied each turn. (Responses API doesn't carry previous instructions automatically.)",
     )
 
     st.markdown("---")
     if st.button("🧹 New chat"):
+        # No stream to close here: the click interrupts any run still streaming,
+        # and leaving its `with client.responses.stream(...)` block closes it.
         st.session_state.clear()
         st.rerun()
 
 # --- Make sure we have an API key ---
-api_key = _get_api_key()
+api_key = get_api_key()
 if not api_key:
     st.error(
         "Missing OPENAI_API_KEY. Add it to a local .env or to Streamlit → App Secrets."
     )
     st.stop()
 
-client = OpenAI(api_key=api_key)
+client = get_client(api_key)
 
 # --- Session state ---
-st.session_state.setdefault("messages", [])  # [{'role': 'user'|'assistant', 'content': str}]
+# Most recent turns only: [{'role': 'user'|'assistant', 'content': str, 'response_id'?: str}]
+st.session_state.setdefault("messages", deque(maxlen=MAX_LOCAL_MESSAGES))
 st.session_state.setdefault("previous_response_id", None)
 
 # --- Tabs: Chat + Image ---
 tab_chat, tab_image = st.tabs(["💬 Chat", "🖼️ Image"])
 
-# -------------------------------
-# Chat tab
-# -------------------------------
 with tab_chat:
-    # Display prior messages
-    for m in st.session_state.messages:
-        with st.chat_message(m["role"]):
-            st.markdown(m["content"])
-
-    # Chat input
-    if prompt := st.chat_input("Ask me anything…"):
-        # Show user turn
-        st.session_state.messages.append({"role": "user", "content": prompt})
-        with st.chat_message("user"):
-            st.markdown(prompt)
-
-        # Assistant turn (streamed)
-        with st.chat_message("assistant"):
-            placeholder = st.empty()
-            acc_text = ""
-
-            tools = [{"type": "web_search_preview"}] if use_web else []
+    render_chat_tab(client, model, sys_prompt, use_web)
 
-            try:
-                # Stream tokens from the Responses API
-                with client.responses.stream(
-                    model=model,
-                    instructions=sys_prompt,
-                    input=prompt,  # only the new user turn; context via previous_response_id
-                    tools=tools,   # optional web search tool
-                    previous_response_id=st.session_state.get("previous_response_id"),
-                ) as stream:
-                    for event in stream:
-                        if event.type == "response.output_text.delta":
-                            acc_text += event.delta
-                            # Render incrementally
-                            placeholder.markdown(acc_text)
-                        elif event.type == "response.error":
-                            placeholder.error(str(event.error))
-
-                    final = stream.get_final_response()
-            except Exception as e:
-                placeholder.error(f"OpenAI error: {e}")
-                final = None
-
-            # Persist and render the final text
-            out_text = getattr(final, "output_text", None) or acc_text
-            if out_text:
-                placeholder.markdown(out_text)
-                st.session_state.messages.append(
-                    {"role": "assistant", "content": out_text}
-                )
-                # Save response id to keep conversation state across turns
-                st.session_state["previous_response_id"] = getattr(final, "id", None)
-
-# -------------------------------
-# Image tab
-# -------------------------------
 with tab_image:
-    image_prompt = st.text_area(
-        "Image prompt",
-        "Draw a gorgeous image of a river made of white owl feathers, snaking its way through a serene winter landscape",
-        height=100,
-    )
-    img_model = os.getenv("OPENAI_IMAGE_MODEL", "gpt-image-1")
-
-    if st.button("Generate image"):
-        gallery: list[bytes] = []
-        final_bytes: bytes | None = None
-        spot = st.empty()
-
-        try:
-            # Always request 3 partial previews per docs.
-            stream = client.images.generate(
-                prompt=image_prompt,
-                model=img_model,
-                stream=True,
-                n=1,
-                partial_images=3,
-            )
-
-            for event in stream:
-                etype = getattr(event, "type", "")
-
-                # Partial frames during generation (no captions)
-                if etype == "image_generation.partial_image":
-                    img_b64 = event.b64_json
-                    img_bytes = base64.b64decode(img_b64)
-                    gallery.append(img_bytes)
-                    spot.image(img_bytes, use_container_width=True)
-
-                # Final image event (Images API terminal event; no caption)
-                elif etype == "image_generation.completed":
-                    img_b64 = event.b64_json
-                    final_bytes = base64.b64decode(img_b64)
-                    spot.image(final_bytes, use_container_width=True)
-
-                # Be tolerant of older/alternate SDK event names (rare)
-                elif etype in (
-                    "image_generation.image",
-                    "image.image",
-                    "image.completed",
-                    "response.image_generation_call.completed",
-                ):
-                    img_b64 = getattr(event, "b64_json", None)
-                    if img_b64:
-                        final_bytes = base64.b64decode(img_b64)
-                        spot.image(final_bytes, use_container_width=True)
-
-                # Error surfaced by the stream
-                elif etype.endswith(".error") or etype == "error":
-                    msg = getattr(event, "error", None)
-                    st.error(f"Image generation error: {msg or repr(event)}")
-
-                # Ignore other event types quietly
-                else:
-                    pass
-
-            # Fallback: if we never saw a final event, show the last partial (no caption)
-            if final_bytes is None and gallery:
-                final_bytes = gallery[-1]
-                spot.image(final_bytes, use_container_width=True)
-
-            if final_bytes:
-                st.download_button(
-                    "Download image",
-                    data=final_bytes,
-                    file_name="generated.png",
-                    mime="image/png",
-                )
-            else:
-                st.info("No image bytes received. Try again.")
-
-        except Exception as e:
-            st.error(f"Image generation error: {e}")
-            st.stop()
+    render_image_tab(client, os.getenv("OPENAI_IMAGE_MODEL", "gpt-image-1"))
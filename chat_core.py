@@ -0,0 +1,336 @@
+# chat_core.py
+# Chat + image tab logic; app.py keeps page config and the sidebar.
+import os
+import time
+import queue
+import threading
+import binascii
+from io import BytesIO
+from typing import Iterator
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+from PIL import Image
+from openai import OpenAI
+
+def get_api_key() -> str | None:
+    key = os.getenv("OPENAI_API_KEY")
+    if key:
+        return key
+    # Streamlit Cloud: add OPENAI_API_KEY in App Secrets
+    try:
+        return st.secrets["OPENAI_API_KEY"]  # type: ignore[index]
+    except Exception:
+        return None
+
+@st.cache_resource
+def get_client(api_key: str) -> OpenAI:
+    # Built once and reused across reruns (keeps the HTTP connection pool warm)
+    return OpenAI(api_key=api_key)
+
+
+# -------------------------------
+# Chat tab
+# -------------------------------
+# Chat request constants
+_WEB_SEARCH_TOOL = ({"type": "web_search_preview"},)
+
+# Only the most recent messages are kept locally; the server keeps the rest
+# (chained via previous_response_id) and they are fetched on demand.
+MAX_LOCAL_MESSAGES = 10
+_EARLIER_PAGE_TURNS = 5
+
+def _push_message(msg: dict) -> None:
+    messages = st.session_state.messages
+    earlier = st.session_state.get("earlier_messages")
+    if len(messages) == messages.maxlen and earlier is not None:
+        # Fetched history ends where the local window starts, so the message
+        # about to drop off the front simply moves over to it.
+        earlier.append(messages[0])
+    messages.append(msg)
+
+def _fetch_turn(client: OpenAI, response_id: str) -> tuple[str, str, str | None]:
+    # Returns (user_text, assistant_text, previous_response_id) for one turn.
+    resp = client.responses.retrieve(response_id)
+    user_text = ""
+    # Newest first, so the first user item is this turn's own prompt
+    for item in client.responses.input_items.list(response_id, order="desc"):
+        if getattr(item, "role", None) == "user":
+            user_text = "".join(
+                getattr(c, "text", "") or "" for c in getattr(item, "content", [])
+            )
+            break
+    return user_text, resp.output_text, resp.previous_response_id
+
+def _load_earlier(client: OpenAI) -> None:
+    fetched: list[dict] = []
+    cursor = st.session_state.get("earlier_cursor")
+    if cursor is None:
+        messages = st.session_state.messages
+        oldest = next((m for m in messages if m.get("response_id")), None)
+        if oldest is None:
+            return
+        if messages[0] is oldest:
+            # The window starts mid-turn: this reply's prompt was evicted, so
+            # fetch it from the reply's own response.
+            user_text, _, cursor = _fetch_turn(client, oldest["response_id"])
+            fetched.append({"role": "user", "content": user_text})
+        else:
+            cursor = client.responses.retrieve(oldest["response_id"]).previous_response_id
+
+    for _ in range(_EARLIER_PAGE_TURNS):
+        if not cursor:
+            break
+        user_text, assistant_text, cursor = _fetch_turn(client, cursor)
+        fetched[:0] = [
+            {"role": "user", "content": user_text},
+            {"role": "assistant", "content": assistant_text},
+        ]
+    st.session_state["earlier_messages"] = fetched + st.session_state.get(
+        "earlier_messages", []
+    )
+    # "" marks the start of the conversation (nothing left to fetch)
+    st.session_state["earlier_cursor"] = cursor or ""
+
+def _drain(stream, q: queue.Queue, stop: threading.Event) -> None:
+    # Producer: read SSE events off the network so UI rendering never blocks it.
+    # Items are (kind, payload); kind is "delta", "error" or "exc".
+    def put(item) -> None:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)  # bounded queue -> backpressure
+                return
+            except queue.Full:
+                continue
+
+    try:
+        for event in stream:
+            if stop.is_set():
+                return
+            etype = event.type
+            if etype == "response.output_text.delta":
+                put(("delta", event.delta))
+            elif etype == "response.error":
+                put(("error", event.error))
+    except Exception as e:
+        put(("exc", e))
+
+def _stream_text(stream, sink: list[str]) -> Iterator[str]:
+    # Consumer side of _drain: yields accumulated text at most every ~120 ms,
+    # so st.write_stream re-renders a handful of times per second, not per token.
+    # A flush also waits for >= 32 new chars or a line/sentence boundary (capped
+    # at 0.5 s), so markdown isn't re-rendered for a one-char change mid-block.
+    # Everything yielded is also appended to `sink`, so it survives a failure.
+    q: queue.Queue = queue.Queue(maxsize=256)
+    stop = threading.Event()
+    producer = threading.Thread(target=_drain, args=(stream, q, stop), daemon=True)
+    producer.start()
+    pending: list[str] = []
+    last_flush = time.monotonic()
+    try:
+        while producer.is_alive() or not q.empty():
+            try:
+                batch = [q.get(timeout=0.1)]
+            except queue.Empty:
+                batch = []
+            # Take everything already available
+            while True:
+                try:
+                    batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            for kind, payload in batch:
+                if kind == "delta":
+                    pending.append(payload)
+                elif kind == "error":
+                    st.error(str(payload))
+                else:
+                    # Show and keep what already arrived before surfacing the error
+                    if pending:
+                        sink.append("".join(pending))
+                        pending.clear()
+                        yield sink[-1]
+                    raise payload
+            if not pending:
+                continue
+            elapsed = time.monotonic() - last_flush
+            if elapsed < 0.12:
+                continue
+            text = "".join(pending)
+            # Deltas carry the space at the start of the next token, so a
+            # sentence end shows up as a trailing "."
+            at_boundary = text.rstrip(" ").endswith(("\n", "."))
+            if elapsed >= 0.5 or len(text) >= 32 or at_boundary:
+                sink.append(text)
+                yield text
+                pending.clear()
+                last_flush = time.monotonic()
+        if pending:
+            sink.append("".join(pending))
+            yield sink[-1]
+    finally:
+        # Unblocks the producer if we bail out early; leaving the `with` block
+        # then closes the stream under it.
+        stop.set()
+
+def render_chat_tab(client: OpenAI, model: str, sys_prompt: str, use_web: bool) -> None:
+    # Older turns live server-side; fetch them only when asked
+    messages = st.session_state.messages
+    if len(messages) == messages.maxlen and st.session_state.get("earlier_cursor") != "":
+        if st.button("📜 Show earlier messages"):
+            try:
+                _load_earlier(client)
+            except Exception as e:
+                st.error(f"OpenAI error: {e}")
+
+    # Display prior messages
+    for m in [*st.session_state.get("earlier_messages", []), *messages]:
+        with st.chat_message(m["role"]):
+            st.markdown(m["content"])
+
+    # Chat input
+    if prompt := st.chat_input("Ask me anything…"):
+        # Show user turn
+        _push_message({"role": "user", "content": prompt})
+        with st.chat_message("user"):
+            st.markdown(prompt)
+
+        # Assistant turn (streamed)
+        with st.chat_message("assistant"):
+            tools = list(_WEB_SEARCH_TOOL) if use_web else []
+            parts: list[str] = []  # text already shown, kept if the stream fails
+
+            try:
+                # Stream tokens from the Responses API
+                with client.responses.stream(
+                    model=model,
+                    instructions=sys_prompt,
+                    input=prompt,  # only the new user turn; context via previous_response_id
+                    tools=tools,   # optional web search tool
+                    previous_response_id=st.session_state.get("previous_response_id"),
+                ) as stream:
+                    # st.write_stream renders incrementally
+                    st.write_stream(_stream_text(stream, parts))
+                    final = stream.get_final_response()
+            except Exception as e:
+                st.error(f"OpenAI error: {e}")
+                final = None
+
+            # Persist the final text
+            out_text = getattr(final, "output_text", None) or "".join(parts)
+            if out_text:
+                response_id = getattr(final, "id", None)
+                _push_message(
+                    {"role": "assistant", "content": out_text, "response_id": response_id}
+                )
+                # Save response id to keep conversation state across turns
+                # (a failed stream has none; keep chaining from the last good one)
+                if response_id:
+                    st.session_state["previous_response_id"] = response_id
+
+
+# -------------------------------
+# Image tab
+# -------------------------------
+# Partial image previews are downscaled JPEGs; only the final image is full-res
+_PREVIEW_WIDTH = 512
+
+def _preview_jpeg(img_bytes: bytes) -> bytes:
+    im = Image.open(BytesIO(img_bytes))
+    im.thumbnail((_PREVIEW_WIDTH, 10**6))  # bound width only; keep portrait sharp
+    buf = BytesIO()
+    im.convert("RGB").save(buf, "JPEG", quality=80)
+    return buf.getvalue()
+
+# Image stream handlers, keyed by event type. `state` holds "latest_partial"
+# and "final_bytes" for one generation.
+def _on_partial_image(event, spot, state: dict) -> None:
+    # Partial frames during generation (no captions)
+    img_bytes = binascii.a2b_base64(event.b64_json)
+    state["latest_partial"] = img_bytes
+    spot.image(_preview_jpeg(img_bytes), width=_PREVIEW_WIDTH)
+
+def _on_final_image(event, spot, state: dict) -> None:
+    # Terminal event (no caption)
+    img_b64 = getattr(event, "b64_json", None)
+    if img_b64:
+        state["final_bytes"] = binascii.a2b_base64(img_b64)
+        spot.image(state["final_bytes"], use_container_width=True)
+
+_IMAGE_HANDLERS = {
+    "image_generation.partial_image": _on_partial_image,
+    "image_generation.completed": _on_final_image,
+    # Be tolerant of older/alternate SDK event names (rare)
+    "image_generation.image": _on_final_image,
+    "image.image": _on_final_image,
+    "image.completed": _on_final_image,
+    "response.image_generation_call.completed": _on_final_image,
+}
+
+def render_image_tab(client: OpenAI, img_model: str) -> None:
+    image_prompt = st.text_area(
+        "Image prompt",
+        "Draw a gorgeous image of a river made of white owl feathers, snaking its way through a serene winter landscape",
+        height=100,
+    )
+
+    if st.button("Generate image"):
+        spot = st.empty()
+        state = {"latest_partial": None, "final_bytes": None}
+        reader = ThreadPoolExecutor(max_workers=1)
+        stream = None
+
+        try:
+            # Always request 3 partial previews per docs.
+            stream = client.images.generate(
+                prompt=image_prompt,
+                model=img_model,
+                stream=True,
+                n=1,
+                partial_images=3,
+            )
+
+            # Read event N+1 off the network while event N is decoded and rendered
+            events = iter(stream)
+            pending = reader.submit(next, events, None)
+            while (event := pending.result()) is not None:
+                pending = reader.submit(next, events, None)
+                etype = getattr(event, "type", "")
+                handler = _IMAGE_HANDLERS.get(etype)
+                if handler is not None:
+                    handler(event, spot, state)
+
+                # Error surfaced by the stream
+                elif etype.endswith(".error") or etype == "error":
+                    msg = getattr(event, "error", None)
+                    st.error(f"Image generation error: {msg or repr(event)}")
+
+                # Ignore other event types quietly
+                else:
+                    pass
+
+            # Fallback: if we never saw a final event, show the last partial (no caption)
+            final_bytes = state["final_bytes"]
+            if final_bytes is None and state["latest_partial"] is not None:
+                final_bytes = state["latest_partial"]
+                spot.image(final_bytes, use_container_width=True)
+
+            if final_bytes:
+                st.download_button(
+                    "Download image",
+                    data=final_bytes,
+                    file_name="generated.png",
+                    mime="image/png",
+                )
+            else:
+                st.info("No image bytes received. Try again.")
+
+        except Exception as e:
+            st.error(f"Image generation error: {e}")
+            st.stop()
+        finally:
+            # shutdown() can't cancel a next() already blocked on the network;
+            # closing the stream releases the connection and unblocks it.
+            if stream is not None:
+                stream.close()
+            reader.shutdown(wait=False, cancel_futures=True)